@@ -1,12 +1,18 @@
 """The Answer Factory — backend FastAPI."""
 import asyncio
+import os
 import secrets
 import logging
-from typing import List, Optional
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 
 from config import (
     ALLOWED_ORIGINS,
@@ -16,15 +22,24 @@ from config import (
     STYLE_PROMPTS,
     SUPPORTED_MODELS,
 )
-from services import ingestion, llm, rag, tokens, verifier
+from services import batch_ingest, cache, ingestion, llm, rag, tokens, verifier
 
 logger = logging.getLogger("answer_factory")
 logging.basicConfig(level=logging.INFO)
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    yield
+    await llm.aclose()
+
+
 app = FastAPI(
     title="The Answer Factory API",
     description="Laboratorio de prompts y parámetros de IA para docentes.",
     version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -45,52 +60,62 @@ def get_session_id(request: Request, response: Response) -> str:
     return sid
 
 
-class GenerateRequest(BaseModel):
-    prompt: str = Field(..., min_length=1)
+# Rangos de los parámetros de muestreo (los mismos que exponen los sliders).
+# Como tipos anotados, la validación corre completa dentro de pydantic-core.
+Temperature = Annotated[float, Field(ge=0.0, le=2.0)]
+TopP = Annotated[float, Field(ge=0.0, le=1.0)]
+Penalty = Annotated[float, Field(ge=-2.0, le=2.0)]
+
+
+class _Payload(BaseModel):
+    # Los requests son inmutables una vez validados; campos desconocidos se
+    # descartan sin error para no romper clientes viejos.
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+
+class _Sampling(_Payload):
+    # Modelo, estilo y perillas de muestreo: comunes a /generate y a cada
+    # variante de /compare.
     model: str = DEFAULT_MODEL
-    temperature: float = 0.7
-    top_p: float = 0.9
-    frequency_penalty: float = 0.0
-    presence_penalty: float = 0.0
-    max_tokens: int = Field(2000, ge=1, le=4000)
     style: str = "natural"
-    use_rag: bool = False
+    temperature: Temperature = 0.7
+    top_p: TopP = 0.9
+    frequency_penalty: Penalty = 0.0
+    presence_penalty: Penalty = 0.0
+    max_tokens: int = Field(2000, ge=1, le=4000)
     stop_sequences: List[str] = []
+
+
+class GenerateRequest(_Sampling):
+    prompt: str = Field(..., min_length=1)
+    use_rag: bool = False
     rag_top_k: int = Field(4, ge=1, le=10)
     return_logprobs: bool = False
     top_logprobs: int = Field(3, ge=1, le=5)
 
 
-class TokenizeRequest(BaseModel):
+class TokenizeRequest(_Payload):
     text: str = Field(..., min_length=1)
     model: str = DEFAULT_MODEL
 
 
-class VerifyRequest(BaseModel):
+class VerifyRequest(_Payload):
     response_text: str = Field(..., min_length=1)
     judge_model: str = DEFAULT_MODEL
 
 
-class VariantRequest(BaseModel):
+class VariantRequest(_Sampling):
     label: str = "Variante"
-    model: str = DEFAULT_MODEL
-    style: str = "natural"
-    temperature: float = 0.7
-    top_p: float = 0.9
-    frequency_penalty: float = 0.0
-    presence_penalty: float = 0.0
-    max_tokens: int = Field(2000, ge=1, le=4000)
-    stop_sequences: List[str] = []
 
 
-class CompareRequest(BaseModel):
+class CompareRequest(_Payload):
     prompt: str = Field(..., min_length=1)
     use_rag: bool = False
     rag_top_k: int = Field(4, ge=1, le=10)
     variants: List[VariantRequest] = Field(..., min_length=2, max_length=4)
 
 
-class TextUploadRequest(BaseModel):
+class TextUploadRequest(_Payload):
     text: str = Field(..., min_length=1)
     title: str = "Documento sin título"
     author: str = "Autor desconocido"
@@ -98,12 +123,29 @@ class TextUploadRequest(BaseModel):
     chunk_overlap: int = Field(150, ge=0, le=1000)
 
 
-class URLUploadRequest(BaseModel):
+class URLUploadRequest(_Payload):
     url: str = Field(..., min_length=4)
     chunk_size: int = Field(1000, ge=200, le=4000)
     chunk_overlap: int = Field(150, ge=0, le=1000)
 
 
+class URLsUploadRequest(_Payload):
+    urls: List[str] = Field(..., min_length=1, max_length=10)
+    chunk_size: int = Field(1000, ge=200, le=4000)
+    chunk_overlap: int = Field(150, ge=0, le=1000)
+
+
+class BatchItem(_Payload):
+    id: str
+    method: str = "POST"
+    url: str
+    body: Optional[Dict[str, Any]] = None
+
+
+class BatchRequest(_Payload):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=20)
+
+
 @app.get("/")
 def root():
     return {"message": "The Answer Factory API · v2", "status": "ok"}
@@ -118,15 +160,53 @@ def health():
     }
 
 
+# No cambia en runtime: lo armamos una vez.
+_PUBLIC_CONFIG = {
+    "models": [
+        {"id": k, "label": v["label"], "provider": v["provider"]}
+        for k, v in SUPPORTED_MODELS.items()
+    ],
+    "default_model": DEFAULT_MODEL,
+    "styles": list(STYLE_PROMPTS.keys()),
+}
+
+
 @app.get("/api/config")
 def get_public_config():
+    return _PUBLIC_CONFIG
+
+
+def _rag_context(session_id: str, prompt: str, top_k: int) -> Tuple[List[str], List[dict]]:
+    retrieved = rag.query(session_id, prompt, n_results=top_k)
+    return rag.format_context_blocks(retrieved), rag.format_sources(retrieved)
+
+
+def _cache_key(payload: GenerateRequest, context_blocks: List[str]) -> Optional[str]:
+    if not cache.is_cacheable(
+        temperature=payload.temperature, return_logprobs=payload.return_logprobs
+    ):
+        return None
+    return cache.make_key(
+        model=payload.model,
+        style=payload.style,
+        temperature=payload.temperature,
+        top_p=payload.top_p,
+        frequency_penalty=payload.frequency_penalty,
+        presence_penalty=payload.presence_penalty,
+        max_tokens=payload.max_tokens,
+        stop_sequences=payload.stop_sequences,
+        context_blocks=context_blocks,
+    )
+
+
+def _usage(result: Dict[str, Any], cached: bool) -> Dict[str, Any]:
+    # Un acierto del caché no gasta tokens del proveedor: reportar los de la
+    # llamada original inflaría el consumo que ve el docente.
+    if cached:
+        return {"input_tokens": 0, "output_tokens": 0}
     return {
-        "models": [
-            {"id": k, "label": v["label"], "provider": v["provider"]}
-            for k, v in SUPPORTED_MODELS.items()
-        ],
-        "default_model": DEFAULT_MODEL,
-        "styles": list(STYLE_PROMPTS.keys()),
+        "input_tokens": result.get("input_tokens"),
+        "output_tokens": result.get("output_tokens"),
     }
 
 
@@ -149,28 +229,33 @@ def generate_response(payload: GenerateRequest, request: Request, response: Resp
     context_blocks: List[str] = []
     sources: List[dict] = []
     if payload.use_rag:
-        retrieved = rag.query(session_id, payload.prompt, n_results=payload.rag_top_k)
-        context_blocks = rag.format_context_blocks(retrieved)
-        sources = rag.format_sources(retrieved)
+        context_blocks, sources = _rag_context(session_id, payload.prompt, payload.rag_top_k)
 
-    try:
-        result = llm.generate(
-            model=payload.model,
-            prompt=payload.prompt,
-            style=payload.style,
-            temperature=payload.temperature,
-            top_p=payload.top_p,
-            frequency_penalty=payload.frequency_penalty,
-            presence_penalty=payload.presence_penalty,
-            max_tokens=payload.max_tokens,
-            stop_sequences=payload.stop_sequences or None,
-            context_blocks=context_blocks,
-            return_logprobs=payload.return_logprobs,
-            top_logprobs=payload.top_logprobs,
-        )
-    except Exception as exc:
-        logger.exception("generate failed")
-        raise HTTPException(status_code=500, detail=f"Error al generar: {exc}")
+    cache_key = _cache_key(payload, context_blocks)
+    result = cache.lookup(cache_key, payload.prompt) if cache_key else None
+
+    cached = result is not None
+    if not cached:
+        try:
+            result = llm.generate(
+                model=payload.model,
+                prompt=payload.prompt,
+                style=payload.style,
+                temperature=payload.temperature,
+                top_p=payload.top_p,
+                frequency_penalty=payload.frequency_penalty,
+                presence_penalty=payload.presence_penalty,
+                max_tokens=payload.max_tokens,
+                stop_sequences=payload.stop_sequences or None,
+                context_blocks=context_blocks,
+                return_logprobs=payload.return_logprobs,
+                top_logprobs=payload.top_logprobs,
+            )
+        except Exception as exc:
+            logger.exception("generate failed")
+            raise HTTPException(status_code=500, detail=f"Error al generar: {exc}")
+        if cache_key:
+            cache.store(cache_key, payload.prompt, result)
 
     return {
         "response": result["text"],
@@ -178,14 +263,149 @@ def generate_response(payload: GenerateRequest, request: Request, response: Resp
         "finish_reason": result.get("finish_reason"),
         "chunks_used": len(context_blocks),
         "sources": sources,
-        "usage": {
-            "input_tokens": result.get("input_tokens"),
-            "output_tokens": result.get("output_tokens"),
-        },
+        "usage": _usage(result, cached),
         "logprobs": result.get("logprobs"),
+        "cached": cached,
     }
 
 
+# El stream no mete pausas artificiales entre tokens; lo que sí puede
+# retenerlos es un proxy intermedio que acumule el body antes de reenviarlo.
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+# Un evento SSE por token satura el event loop con muchos clientes a la vez.
+# Agrupamos deltas hasta ~6 tokens o 40 ms, lo que ocurra primero.
+_STREAM_FLUSH_CHARS = 24
+_STREAM_FLUSH_SECONDS = 0.04
+
+
+async def _coalesce(events: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Agrupa los deltas de ``llm.astream``; el evento ``done`` pasa tal cual."""
+    buffer: List[str] = []
+    size = 0
+    last_flush = time.monotonic()
+    async for event in events:
+        if event.get("done"):
+            if buffer:
+                yield {"text": "".join(buffer)}
+                buffer = []
+            yield event
+            continue
+        buffer.append(event["text"])
+        size += len(event["text"])
+        now = time.monotonic()
+        if size >= _STREAM_FLUSH_CHARS or now - last_flush >= _STREAM_FLUSH_SECONDS:
+            yield {"text": "".join(buffer)}
+            buffer = []
+            size = 0
+            last_flush = now
+    if buffer:
+        yield {"text": "".join(buffer)}
+
+
+def _sse(event: dict) -> str:
+    return f"data: {orjson.dumps(event).decode()}\n\n"
+
+
+@app.post("/api/generate/stream")
+async def generate_stream(payload: GenerateRequest, request: Request, response: Response):
+    """Variante de /api/generate que emite la respuesta como Server-Sent Events.
+
+    Cada evento lleva ``{"token": ...}``; el último es ``{"done": true, ...}`` con
+    los mismos metadatos que /api/generate (fuentes, uso, finish_reason). Los
+    logprobs no se transmiten por este canal.
+    """
+    session_id = get_session_id(request, response)
+    headers = {**_SSE_HEADERS, SESSION_HEADER: session_id}
+
+    if not OPENAI_API_KEY:
+        async def test_mode():
+            yield _sse({
+                "token": (
+                    "[Modo de prueba — OPENAI_API_KEY no configurada]\n"
+                    f"Prompt recibido: {payload.prompt}"
+                )
+            })
+            yield _sse({
+                "done": True,
+                "model": payload.model,
+                "chunks_used": 0,
+                "sources": [],
+                "usage": None,
+            })
+        return StreamingResponse(test_mode(), media_type="text/event-stream", headers=headers)
+
+    # Chroma y el caché son síncronos: los mandamos al threadpool para no
+    # frenar el event loop que atiende los demás streams.
+    context_blocks: List[str] = []
+    sources: List[dict] = []
+    if payload.use_rag:
+        context_blocks, sources = await asyncio.to_thread(
+            _rag_context, session_id, payload.prompt, payload.rag_top_k
+        )
+
+    cache_key = _cache_key(payload, context_blocks)
+    cached_result = (
+        await asyncio.to_thread(cache.lookup, cache_key, payload.prompt) if cache_key else None
+    )
+
+    async def events():
+        if cached_result is not None:
+            yield _sse({"token": cached_result["text"]})
+            final = {**cached_result, "done": True}
+        else:
+            parts: List[str] = []
+            final = None
+            try:
+                async for event in _coalesce(llm.astream(
+                    model=payload.model,
+                    prompt=payload.prompt,
+                    style=payload.style,
+                    temperature=payload.temperature,
+                    top_p=payload.top_p,
+                    frequency_penalty=payload.frequency_penalty,
+                    presence_penalty=payload.presence_penalty,
+                    max_tokens=payload.max_tokens,
+                    stop_sequences=payload.stop_sequences or None,
+                    context_blocks=context_blocks,
+                )):
+                    if event.get("done"):
+                        final = event
+                    else:
+                        parts.append(event["text"])
+                        yield _sse({"token": event["text"]})
+            except Exception as exc:
+                # Con el stream ya abierto no podemos cambiar el status HTTP.
+                logger.exception("generate stream failed")
+                yield _sse({"error": f"Error al generar: {exc}"})
+                return
+            if cache_key:
+                await asyncio.to_thread(cache.store, cache_key, payload.prompt, {
+                    "text": "".join(parts),
+                    "model": final["model"],
+                    "input_tokens": final.get("input_tokens"),
+                    "output_tokens": final.get("output_tokens"),
+                    "finish_reason": final.get("finish_reason"),
+                    "logprobs": None,
+                })
+
+        yield _sse({
+            "done": True,
+            "model": final["model"],
+            "finish_reason": final.get("finish_reason"),
+            "chunks_used": len(context_blocks),
+            "sources": sources,
+            "usage": _usage(final, cached_result is not None),
+            "cached": cached_result is not None,
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
 @app.post("/api/tokenize")
 def tokenize_endpoint(payload: TokenizeRequest):
     return tokens.tokenize(payload.text, payload.model)
@@ -235,9 +455,7 @@ async def compare(payload: CompareRequest, request: Request, response: Response)
     context_blocks: List[str] = []
     sources: List[dict] = []
     if payload.use_rag:
-        retrieved = rag.query(session_id, payload.prompt, n_results=payload.rag_top_k)
-        context_blocks = rag.format_context_blocks(retrieved)
-        sources = rag.format_sources(retrieved)
+        context_blocks, sources = _rag_context(session_id, payload.prompt, payload.rag_top_k)
 
     def _run(variant: VariantRequest):
         try:
@@ -338,6 +556,75 @@ def upload_url(payload: URLUploadRequest, request: Request, response: Response):
     }
 
 
+@app.post("/api/upload-urls")
+async def upload_urls(payload: URLsUploadRequest, request: Request, response: Response):
+    """Varias URLs en una llamada: se descargan en paralelo y cada página se
+    indexa como fuente propia. Una URL caída no tumba a las demás."""
+    session_id = get_session_id(request, response)
+    fetched = await ingestion.extract_urls(payload.urls)
+
+    results = []
+    for url, got in zip(payload.urls, fetched):
+        if isinstance(got, Exception):
+            results.append({"url": url, "status": "error", "detail": f"No se pudo obtener la URL: {got}"})
+            continue
+        title, text = got
+        chunks = ingestion.chunk_text(text, payload.chunk_size, payload.chunk_overlap)
+        if not chunks:
+            results.append({"url": url, "status": "error", "detail": "La página no contiene texto utilizable"})
+            continue
+        count = await asyncio.to_thread(
+            _safe_add_chunks,
+            session_id,
+            chunks,
+            title=title,
+            author="Autor desconocido",
+            source_type="url",
+            source_ref=url,
+        )
+        results.append({
+            "url": url,
+            "status": "success",
+            "chunks_created": count,
+            "metadata": {"title": title, "url": url},
+        })
+    return {
+        "chunks_created": sum(r.get("chunks_created", 0) for r in results),
+        "results": results,
+    }
+
+
+_PDF_MAX_BYTES = 50 * 1024 * 1024
+_UPLOAD_CHUNK_BYTES = 1 << 20
+
+
+async def _spool_upload(file: UploadFile) -> str:
+    """Copia el upload a disco en bloques de 1 MiB y devuelve la ruta.
+
+    Así el PDF nunca vive entero en memoria y los workers de extracción lo
+    abren por ruta en lugar de recibir los bytes serializados.
+    """
+    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    size = 0
+    try:
+        while chunk := await file.read(_UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > _PDF_MAX_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"El PDF supera el máximo de {_PDF_MAX_BYTES // (1024 * 1024)} MB",
+                )
+            tmp.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="El PDF está vacío")
+    except BaseException:
+        tmp.close()
+        os.unlink(tmp.name)
+        raise
+    tmp.close()
+    return tmp.name
+
+
 @app.post("/api/upload-pdf")
 async def upload_pdf(
     request: Request,
@@ -345,10 +632,20 @@ async def upload_pdf(
     file: UploadFile = File(...),
     title: Optional[str] = None,
     author: Optional[str] = None,
+    defer: bool = False,
 ):
     session_id = get_session_id(request, response)
-    contents = await file.read()
-    pages = ingestion.extract_pdf_pages(contents)
+    if defer and not OPENAI_API_KEY:
+        raise HTTPException(status_code=503, detail="OPENAI_API_KEY es requerida.")
+    pdf_path = await _spool_upload(file)
+    # Extracción y embeddings son CPU/red síncronos: fuera del event loop.
+    try:
+        pages = await asyncio.to_thread(ingestion.extract_pdf_pages, pdf_path)
+    except Exception as exc:
+        logger.warning("pdf extraction failed: %s", exc)
+        raise HTTPException(status_code=400, detail="No se pudo leer el PDF (¿archivo dañado o protegido?)")
+    finally:
+        os.unlink(pdf_path)
     if not pages:
         raise HTTPException(status_code=400, detail="No se pudo extraer texto del PDF")
     pairs = ingestion.chunk_pages(pages, 1000, 150)
@@ -357,11 +654,38 @@ async def upload_pdf(
     chunks = [p[0] for p in pairs]
     chunk_pages = [p[1] for p in pairs]
     pdf_title = title or (file.filename or "PDF").replace(".pdf", "")
-    count = _safe_add_chunks(
+    pdf_author = (author or "").strip() or "Autor desconocido"
+
+    if defer:
+        # Indexación diferida vía Batch API: respondemos ya con el id del batch
+        # y el poller de batch_ingest guarda los vectores cuando terminen.
+        try:
+            batch_id = await asyncio.to_thread(
+                batch_ingest.submit,
+                session_id,
+                chunks,
+                title=pdf_title,
+                author=pdf_author,
+                source_type="pdf",
+                source_ref=file.filename or "archivo.pdf",
+                pages=chunk_pages,
+            )
+        except Exception as exc:
+            logger.exception("batch submit failed")
+            raise HTTPException(status_code=502, detail=f"No se pudo encolar el batch: {exc}")
+        return {
+            "status": "queued",
+            "batch_id": batch_id,
+            "chunks_queued": len(chunks),
+            "metadata": {"title": pdf_title, "filename": file.filename, "pages": len(pages)},
+        }
+
+    count = await asyncio.to_thread(
+        _safe_add_chunks,
         session_id,
         chunks,
         title=pdf_title,
-        author=(author or "").strip() or "Autor desconocido",
+        author=pdf_author,
         source_type="pdf",
         source_ref=file.filename or "archivo.pdf",
         pages=chunk_pages,
@@ -373,6 +697,19 @@ async def upload_pdf(
     }
 
 
+@app.get("/api/ingest-jobs/{batch_id}")
+def ingest_job_status(batch_id: str, request: Request, response: Response):
+    session_id = get_session_id(request, response)
+    try:
+        job = batch_ingest.status(batch_id, session_id)
+    except Exception as exc:
+        logger.exception("batch status failed")
+        raise HTTPException(status_code=502, detail=f"No se pudo consultar el batch: {exc}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de ingesta no encontrado")
+    return job
+
+
 @app.delete("/api/clear-rag")
 def clear_rag(request: Request, response: Response):
     session_id = get_session_id(request, response)
@@ -386,6 +723,75 @@ def rag_status(request: Request, response: Response):
     return rag.status(session_id)
 
 
+# Rutas que /api/batch sabe despachar en proceso, sin re-entrar por HTTP.
+# Todas se adaptan a la firma (payload, request, response). Quedan fuera el
+# stream y la subida de PDF (multipart).
+_BATCH_ROUTES: Dict[Tuple[str, str], Tuple[Optional[type], Callable]] = {
+    ("GET", "/api/config"): (None, lambda payload, request, response: get_public_config()),
+    ("POST", "/api/generate"): (GenerateRequest, generate_response),
+    ("POST", "/api/compare"): (CompareRequest, compare),
+    ("POST", "/api/tokenize"): (
+        TokenizeRequest,
+        lambda payload, request, response: tokenize_endpoint(payload),
+    ),
+    ("POST", "/api/verify-claims"): (VerifyRequest, verify_claims),
+    ("POST", "/api/upload-text"): (TextUploadRequest, upload_text),
+    ("POST", "/api/upload-url"): (URLUploadRequest, upload_url),
+    ("POST", "/api/upload-urls"): (URLsUploadRequest, upload_urls),
+    ("GET", "/api/rag-status"): (None, lambda payload, request, response: rag_status(request, response)),
+}
+
+
+async def _dispatch(item: BatchItem, request: Request) -> Dict[str, Any]:
+    route = _BATCH_ROUTES.get((item.method.upper(), item.url))
+    if route is None:
+        return {
+            "id": item.id,
+            "status": 404,
+            "body": {"detail": f"Ruta no disponible en /api/batch: {item.method} {item.url}"},
+        }
+    model, handler = route
+    sub_response = Response()
+    try:
+        payload = model.model_validate(item.body or {}) if model else None
+        if asyncio.iscoroutinefunction(handler):
+            body = await handler(payload, request, sub_response)
+        else:
+            body = await asyncio.to_thread(handler, payload, request, sub_response)
+    except ValidationError as exc:
+        return {
+            "id": item.id,
+            "status": 422,
+            "body": {"detail": exc.errors(include_url=False, include_context=False)},
+        }
+    except HTTPException as exc:
+        return {"id": item.id, "status": exc.status_code, "body": {"detail": exc.detail}}
+    except Exception as exc:
+        logger.exception("batch item %s failed", item.id)
+        return {"id": item.id, "status": 500, "body": {"detail": str(exc)}}
+    return {"id": item.id, "status": 200, "body": body}
+
+
+@app.post("/api/batch")
+async def batch(payload: BatchRequest, request: Request, response: Response):
+    """Ejecuta varias llamadas a la API en un solo viaje y en paralelo.
+
+    Respuesta con la forma de los batches de Microsoft Graph:
+    ``{"responses": [{"id", "status", "body"}]}``, en el mismo orden.
+    """
+    session_id = get_session_id(request, response)
+    # Todas las sub-llamadas comparten la sesión, aunque el cliente no haya
+    # mandado el header y acabemos de generarla.
+    scope = dict(request.scope)
+    scope["headers"] = [
+        (k, v) for k, v in request.scope["headers"] if k.decode("latin-1").lower() != SESSION_HEADER.lower()
+    ] + [(SESSION_HEADER.lower().encode("latin-1"), session_id.encode("latin-1"))]
+    sub_request = Request(scope)
+
+    responses = await asyncio.gather(*[_dispatch(item, sub_request) for item in payload.requests])
+    return {"responses": responses}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
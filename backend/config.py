@@ -1,6 +1,8 @@
 """Configuración centralizada del laboratorio."""
 import os
 from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,6 +19,23 @@ CHROMA_DB_PATH.mkdir(parents=True, exist_ok=True)
 
 # Modelos
 EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_BATCH_SIZE = 100  # textos por request al endpoint de embeddings
+
+# Procesos para extraer PDFs grandes. Cada worker de PyMuPDF ronda los 75 MB de
+# RSS: en el plan starter de Render (512 MB) más de dos dejan sin memoria al
+# servidor. Nunca se usan más que los núcleos disponibles.
+PDF_WORKERS = max(1, min(int(os.getenv("PDF_WORKERS", "2")), os.cpu_count() or 1))
+
+# Caché semántico de respuestas. Sólo aplica a temperaturas bajas: por encima
+# de este umbral la variabilidad entre corridas es parte de lo que el docente
+# está explorando y no queremos devolverle siempre la misma respuesta.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_MAX_TEMPERATURE = float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0.2"))
+RESPONSE_CACHE_MAX_DISTANCE = 0.15  # distancia coseno máxima para considerar "el mismo prompt"
+# Sin vencimiento ni tope la colección crece con cada respuesta y termina
+# llenando el disco de 1 GB que comparte con el RAG.
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
 
 DEFAULT_MODEL = "claude-sonnet-4-6"
 SUPPORTED_MODELS = {
@@ -44,8 +63,9 @@ Tono. Hablas a un colega docente, profesional adulto. Sin condescendencia, sin v
 
 Pertinencia pedagógica. Cuando el tema lo permita, aterrizas la respuesta en la práctica concreta del aula: qué hace el docente con esto el lunes en la mañana, frente a sus alumnos reales."""
 
-# Estilos didácticos — se SUMAN encima de BASE_SYSTEM
-STYLE_PROMPTS = {
+# Estilos didácticos — se SUMAN encima de BASE_SYSTEM. Solo lectura: se
+# comparte entre requests y los system prompts finales se precalculan en llm.
+STYLE_PROMPTS: Mapping[str, Optional[str]] = MappingProxyType({
     # --- Sección académica ---
     "natural":          None,
     "scientific":       (
@@ -94,7 +114,7 @@ STYLE_PROMPTS = {
     "comedian":         "Responde como un comediante tratando de hacer todo gracioso con chistes y juegos de palabras.",
     "pirate":           "¡Arrr! Responde como un pirata con jerga pirata y referencias náuticas, marinero.",
     "chef":             "Responde como un chef, usando metáforas culinarias para explicar todo como si fuera una receta.",
-}
+})
 
 # CORS
 ALLOWED_ORIGINS = [
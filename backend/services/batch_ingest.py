@@ -0,0 +1,206 @@
+"""Ingesta diferida con la Batch API de OpenAI.
+
+Para PDFs largos el docente puede pedir que la indexación no bloquee la subida:
+mandamos los embeddings como un batch (mitad de precio y límites de tasa
+aparte), devolvemos el ``batch_id`` de inmediato y un hilo en segundo plano
+guarda los vectores en Chroma cuando el batch termina.
+
+Los trabajos pendientes viven en memoria: si el proceso se reinicia antes de
+que el batch termine, hay que volver a subir el documento.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from config import EMBEDDING_MODEL
+from services import llm, rag
+
+logger = logging.getLogger("answer_factory.batch_ingest")
+
+_POLL_SECONDS = 60
+_FINAL_STATES = {"indexed", "failed", "expired", "cancelled"}
+# Un hilo ya está guardando los vectores del batch: nadie más lo toca.
+_INDEXING = "indexing"
+_SETTLED_STATES = _FINAL_STATES | {_INDEXING}
+
+# Los trabajos terminados se conservan para consultar su estado, pero solo los
+# últimos _FINISHED_MAX: la cola permite soltar el más viejo en O(1).
+_FINISHED_MAX = 200
+
+_jobs: Dict[str, Dict[str, Any]] = {}
+_finished: deque = deque()
+_lock = threading.Lock()
+_poller: Optional[threading.Thread] = None
+
+
+def _build_jsonl(chunks: List[str]) -> bytes:
+    lines = [
+        json.dumps(
+            {
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/embeddings",
+                "body": {"model": EMBEDDING_MODEL, "input": chunk},
+            },
+            ensure_ascii=False,
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+    return "\n".join(lines).encode("utf-8")
+
+
+def submit(
+    session_id: str,
+    chunks: List[str],
+    *,
+    title: str,
+    author: str,
+    source_type: str,
+    source_ref: str,
+    pages: Optional[List[int]] = None,
+) -> str:
+    """Encola los embeddings de ``chunks`` y devuelve el id del batch."""
+    client = llm.get_openai()
+    input_file = client.files.create(
+        file=("embeddings.jsonl", _build_jsonl(chunks)),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/embeddings",
+        completion_window="24h",
+    )
+    with _lock:
+        _jobs[batch.id] = {
+            "session_id": session_id,
+            "chunks": chunks,
+            "meta": {
+                "title": title,
+                "author": author,
+                "source_type": source_type,
+                "source_ref": source_ref,
+                "pages": pages,
+            },
+            "status": batch.status,
+            "chunks_created": 0,
+            "error": None,
+        }
+    _ensure_poller()
+    return batch.id
+
+
+def _summary(batch_id: str, job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "batch_id": batch_id,
+        "status": job["status"],
+        "title": job["meta"]["title"],
+        "chunks_created": job["chunks_created"],
+        "error": job["error"],
+    }
+
+
+def _read_vectors(client: Any, output_file_id: str, total: int) -> List[List[float]]:
+    content = client.files.content(output_file_id).text
+    vectors: Dict[int, List[float]] = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        body = (record.get("response") or {}).get("body") or {}
+        data = body.get("data") or []
+        if data:
+            vectors[int(record["custom_id"])] = data[0]["embedding"]
+    missing = total - len(vectors)
+    if missing:
+        raise RuntimeError(f"El batch no devolvió embeddings para {missing} fragmentos")
+    return [vectors[i] for i in range(total)]
+
+
+def _finish(batch_id: str, job: Dict[str, Any]) -> None:
+    # Ya no necesitamos el texto en memoria. Se llama con _lock tomado.
+    job["chunks"] = []
+    _finished.append(batch_id)
+    while len(_finished) > _FINISHED_MAX:
+        _jobs.pop(_finished.popleft(), None)
+
+
+def poll(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Consulta el batch y, si ya terminó, indexa sus vectores en Chroma.
+
+    ``_lock`` solo se toma para leer y escribir ``_jobs``: la consulta a la
+    API y la escritura en Chroma van fuera, para que ``status`` de otros
+    trabajos y ``submit`` no esperen la red."""
+    with _lock:
+        job = _jobs.get(batch_id)
+        if job is None:
+            return None
+        if job["status"] in _SETTLED_STATES:
+            return _summary(batch_id, job)
+
+    client = llm.get_openai()
+    batch = client.batches.retrieve(batch_id)
+
+    with _lock:
+        # Otro hilo pudo haber avanzado el trabajo mientras consultábamos.
+        if job["status"] in _SETTLED_STATES:
+            return _summary(batch_id, job)
+        if batch.status != "completed":
+            job["status"] = batch.status
+            if job["status"] in _FINAL_STATES:
+                _finish(batch_id, job)
+            return _summary(batch_id, job)
+        job["status"] = _INDEXING
+        chunks = job["chunks"]
+
+    try:
+        vectors = _read_vectors(client, batch.output_file_id, len(chunks))
+        created = rag.add_chunks(
+            job["session_id"],
+            chunks,
+            embeddings=vectors,
+            **job["meta"],
+        )
+        final, error = "indexed", None
+    except Exception as exc:
+        logger.exception("batch ingest %s failed", batch_id)
+        created, final, error = 0, "failed", str(exc)
+
+    with _lock:
+        job["chunks_created"] = created
+        job["status"] = final
+        job["error"] = error
+        _finish(batch_id, job)
+        return _summary(batch_id, job)
+
+
+def status(batch_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        job = _jobs.get(batch_id)
+    if job is None or job["session_id"] != session_id:
+        return None
+    return poll(batch_id)
+
+
+def _poll_loop() -> None:
+    while True:
+        time.sleep(_POLL_SECONDS)
+        with _lock:
+            pending = [bid for bid, job in _jobs.items() if job["status"] not in _SETTLED_STATES]
+        for batch_id in pending:
+            try:
+                poll(batch_id)
+            except Exception:
+                logger.warning("batch poll %s failed", batch_id, exc_info=True)
+
+
+def _ensure_poller() -> None:
+    global _poller
+    with _lock:
+        if _poller is None or not _poller.is_alive():
+            _poller = threading.Thread(target=_poll_loop, name="batch-ingest-poller", daemon=True)
+            _poller.start()
@@ -0,0 +1,115 @@
+"""Caché semántico de respuestas del LLM sobre una colección de Chroma.
+
+Cuando un prompt es casi idéntico (distancia coseno bajo el umbral) a otro ya
+respondido con exactamente la misma configuración — modelo, estilo, parámetros
+de muestreo y contexto RAG — devolvemos la respuesta guardada y nos ahorramos
+el viaje completo al proveedor.
+
+Las entradas vencen a los ``RESPONSE_CACHE_TTL_SECONDS`` y la colección no
+pasa de ``RESPONSE_CACHE_MAX_ENTRIES``: cada tanto ``store`` borra lo vencido
+y, si sigue sobrando, lo más viejo.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_DISTANCE,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_TEMPERATURE,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from services import rag
+
+logger = logging.getLogger("answer_factory.cache")
+
+_COLLECTION_NAME = "llm_response_cache"
+# Podar en cada store sería un get/delete extra por respuesta; con esto se poda
+# en el primer store tras arrancar y después una vez cada tanto.
+_PRUNE_EVERY = 50
+_stores = itertools.count()
+
+
+def _get_collection():
+    return rag.get_client().get_or_create_collection(
+        name=_COLLECTION_NAME,
+        metadata={"hnsw:space": "cosine"},
+    )
+
+
+def is_cacheable(*, temperature: float, return_logprobs: bool = False) -> bool:
+    return (
+        RESPONSE_CACHE_ENABLED
+        and not return_logprobs
+        and temperature <= RESPONSE_CACHE_MAX_TEMPERATURE
+    )
+
+
+def make_key(**fields: Any) -> str:
+    """Huella de todo lo que, además del prompt, determina la respuesta."""
+    raw = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lookup(key: str, prompt: str) -> Optional[Dict[str, Any]]:
+    try:
+        collection = _get_collection()
+        if collection.count() == 0:
+            return None
+        res = collection.query(
+            query_embeddings=[rag.embed(prompt)],
+            n_results=1,
+            # Las entradas vencidas que todavía no se podaron no cuentan.
+            where={"$and": [
+                {"key": key},
+                {"created": {"$gte": int(time.time()) - RESPONSE_CACHE_TTL_SECONDS}},
+            ]},
+            include=["documents", "distances"],
+        )
+    except Exception:
+        logger.warning("response cache lookup failed", exc_info=True)
+        return None
+
+    distances = (res.get("distances") or [[]])[0]
+    documents = (res.get("documents") or [[]])[0]
+    if not distances or distances[0] is None or distances[0] >= RESPONSE_CACHE_MAX_DISTANCE:
+        return None
+    try:
+        return json.loads(documents[0])
+    except (IndexError, TypeError, ValueError):
+        return None
+
+
+def _prune(collection) -> None:
+    collection.delete(where={"created": {"$lt": int(time.time()) - RESPONSE_CACHE_TTL_SECONDS}})
+    excess = collection.count() - RESPONSE_CACHE_MAX_ENTRIES
+    if excess <= 0:
+        return
+    res = collection.get(include=["metadatas"])
+    ages = sorted(
+        zip(res["ids"], res["metadatas"]),
+        key=lambda item: (item[1] or {}).get("created", 0),
+    )
+    collection.delete(ids=[entry_id for entry_id, _ in ages[:excess]])
+
+
+def store(key: str, prompt: str, result: Dict[str, Any]) -> None:
+    try:
+        collection = _get_collection()
+        collection.add(
+            ids=[str(uuid.uuid4())],
+            embeddings=[rag.embed(prompt)],
+            # La respuesta va como documento: la metadata queda chica para que
+            # _prune pueda leerla entera sin traer todas las respuestas.
+            documents=[json.dumps(result, ensure_ascii=False)],
+            metadatas=[{"key": key, "created": int(time.time())}],
+        )
+        if next(_stores) % _PRUNE_EVERY == 0:
+            _prune(collection)
+    except Exception:
+        logger.warning("response cache store failed", exc_info=True)
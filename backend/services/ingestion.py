@@ -1,29 +1,111 @@
 """Extracción y troceo de texto desde texto plano, URL y PDF."""
-from io import BytesIO
-from typing import List, Tuple
-from urllib.parse import urlparse
+import asyncio
+import codecs
+import hashlib
+import logging
+import math
+import multiprocessing
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+from urllib.parse import ParseResult, urlparse
 
+import httpx
+import pymupdf
 import requests
-from bs4 import BeautifulSoup
-from pdfminer.high_level import extract_text
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.dammit import EncodingDetector
+
+from config import PDF_WORKERS
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # opcional: sin selectolax usamos solo bs4
+    LexborHTMLParser = None
+
+try:
+    from lxml import etree
+except ImportError:  # opcional: sin lxml las páginas grandes van por el DOM
+    etree = None
+
+logger = logging.getLogger("answer_factory.ingestion")
+
+# La extracción de PDF es CPU pura: repartimos rangos de páginas entre procesos.
+# Por debajo de este tamaño levantar/alimentar procesos cuesta más que extraer
+# las páginas aquí mismo.
+_PDF_PARALLEL_MIN_PAGES = 8
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+# Texto ya extraído, por hash del contenido (blake2b: rápido y en la stdlib).
+# Los mismos bytes —el mismo PDF o la misma página HTML llegando por otra
+# URL— no se vuelven a parsear. El tope es de caracteres, no de entradas:
+# unos pocos libros en PDF pesan más que cientos de páginas web, y en el plan
+# de 512 MB eso es lo que importa. Un texto que solo cabría vaciando medio
+# caché no se guarda.
+_PARSED_CACHE_MAX_CHARS = 16 * 1024 * 1024
+_PARSED_ENTRY_MAX_CHARS = _PARSED_CACHE_MAX_CHARS // 4
+_parsed_cache: "OrderedDict[Tuple[str, bytes], Tuple[int, Any]]" = OrderedDict()
+_parsed_chars = 0
+_parsed_lock = threading.Lock()
+
+
+def _text_chars(texts: Tuple[str, ...]) -> int:
+    return sum(map(len, texts))
+
+
+def _parsed_get(key: Tuple[str, bytes]) -> Any:
+    with _parsed_lock:
+        entry = _parsed_cache.get(key)
+        if entry is None:
+            return None
+        _parsed_cache.move_to_end(key)
+        return entry[1]
+
+
+def _parsed_put(key: Tuple[str, bytes], value: Tuple[str, ...]) -> None:
+    global _parsed_chars
+    size = _text_chars(value)
+    if size > _PARSED_ENTRY_MAX_CHARS:
+        return
+    with _parsed_lock:
+        old = _parsed_cache.pop(key, None)
+        if old is not None:
+            _parsed_chars -= old[0]
+        _parsed_cache[key] = (size, value)
+        _parsed_chars += size
+        while _parsed_chars > _PARSED_CACHE_MAX_CHARS:
+            _, (evicted, _) = _parsed_cache.popitem(last=False)
+            _parsed_chars -= evicted
+
+
+def _chunk_starts(n: int, chunk_size: int, overlap: int) -> range:
+    if chunk_size <= overlap:
+        raise ValueError("chunk_size debe ser mayor que overlap")
+    if not n:
+        return range(0)
+    # Los inicios avanzan de a (chunk_size - overlap); el último es el primero
+    # cuyo chunk alcanza el final, así que ninguno queda hecho solo de solape.
+    return range(0, max(n - overlap, 1), chunk_size - overlap)
 
 
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 150) -> List[str]:
+    # Sin espacios en los extremos, strip() devuelve el mismo objeto: no hay
+    # copia que evitar en el caso típico de texto ya limpio.
     text = text.strip()
     if not text:
         return []
-    if chunk_size <= overlap:
-        raise ValueError("chunk_size debe ser mayor que overlap")
-    chunks: List[str] = []
-    start = 0
-    n = len(text)
-    while start < n:
-        end = min(start + chunk_size, n)
-        chunks.append(text[start:end])
-        if end == n:
-            break
-        start = end - overlap
-    return chunks
+    # Comprensión directa sobre el range de inicios: CPython no preasigna la
+    # lista, pero medido sigue siendo ~2× más rápido que ``[None] * n`` más
+    # asignación por índice.
+    return [text[i : i + chunk_size] for i in _chunk_starts(len(text), chunk_size, overlap)]
 
 
 def chunk_pages(
@@ -32,34 +114,157 @@ def chunk_pages(
     overlap: int = 150,
 ) -> List[Tuple[str, int]]:
     """Trocea respetando los límites de página: cada chunk lleva su número de página real (1-indexed)."""
-    out: List[Tuple[str, int]] = []
-    for idx, raw in enumerate(pages, start=1):
-        page_text = (raw or "").strip()
-        if not page_text:
-            continue
-        for piece in chunk_text(page_text, chunk_size, overlap):
-            out.append((piece, idx))
-    return out
+    # chunk_text ya descarta páginas vacías o solo con espacios.
+    return [
+        (piece, idx)
+        for idx, raw in enumerate(pages, start=1)
+        for piece in chunk_text(raw or "", chunk_size, overlap)
+    ]
 
 
-def extract_url(url: str, timeout: int = 15) -> tuple[str, str]:
-    """Devuelve (título, texto_limpio) de una URL."""
-    parsed = urlparse(url)
-    if parsed.scheme not in ("http", "https"):
-        raise ValueError("URL inválida; debe empezar con http(s)://")
+_CONNECT_TIMEOUT = 3
+_USER_AGENT = (
+    "Mozilla/5.0 (compatible; AnswerFactoryLab/1.0; "
+    "+https://crash-course-ia-docentes.local)"
+)
+# El cuerpo se lee por bloques y se corta al pasar el tope: una respuesta
+# enorme (o binaria) no llega ni a memoria ni al parser HTML.
+_URL_MAX_BYTES = 10 * 1024 * 1024
+_URL_READ_CHUNK = 64 * 1024
+_URL_TEXT_MIMES = {"application/xhtml+xml", "application/xml"}
+# Páginas ya parseadas por URL, con sus validadores HTTP. Mientras el
+# Cache-Control diga que siguen frescas no salimos a la red; después se
+# revalidan con If-None-Match / If-Modified-Since y un 304 evita tanto la
+# descarga como el parseo. Mismo criterio de tope que _parsed_cache.
+_PAGE_CACHE_MAX_CHARS = 8 * 1024 * 1024
+_PAGE_ENTRY_MAX_CHARS = _PAGE_CACHE_MAX_CHARS // 4
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+_page_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_page_cache_chars = 0
+_page_cache_lock = threading.Lock()
+# Descargas en paralelo de extract_urls: tope global y por host, para no
+# martillar un mismo sitio cuando el docente pega varias páginas suyas.
+_URLS_MAX_CONNECTIONS = 20
+_URLS_PER_HOST = 4
 
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (compatible; AnswerFactoryLab/1.0; "
-            "+https://crash-course-ia-docentes.local)"
-        )
-    }
-    resp = requests.get(url, timeout=timeout, headers=headers)
-    resp.raise_for_status()
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+def _build_session() -> requests.Session:
+    # Una sola sesión para todas las URLs: reutiliza conexiones TCP/TLS
+    # (keep-alive) entre descargas al mismo host y reintenta fallas
+    # transitorias de red o 502/503/504.
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=20,
+        pool_maxsize=50,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504)),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = _USER_AGENT
+    # Accept-Encoding lo arma urllib3 según los decodificadores instalados: con
+    # el paquete ``brotli`` incluye "br" (y httpx hace lo mismo). No lo fijamos
+    # a mano para no pedir br en un entorno que no lo sepa descomprimir.
+    return session
+
 
-    for tag in soup(["script", "style", "noscript", "iframe", "header", "footer", "nav", "aside"]):
+_SESSION = _build_session()
+
+_INLINE_WS = re.compile(r"[^\S\r\n]+")
+_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+# <meta charset> tiene que aparecer al principio del documento.
+_SNIFF_BYTES = 16 * 1024
+_NOISE_TAGS = ["script", "style", "noscript", "iframe", "header", "footer", "nav", "aside"]
+_NOISE_SET = frozenset(_NOISE_TAGS)
+_NOISE_SELECTOR = ", ".join(_NOISE_TAGS)
+# El strainer deja fuera del árbol de bs4 todo lo que no carga texto (<head>
+# salvo el título, <svg>, <link>...). Los tags de ruido tienen que entrar: si
+# no, su texto sobrevive suelto y el decompose de después no lo encuentra. Es
+# de solo lectura, así que se arma una vez y se comparte entre llamadas.
+_STRAINER = SoupStrainer([
+    "title", "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "blockquote",
+    "pre", "article", "section", "main", "td", "th", "span", "div",
+    *_NOISE_TAGS,
+])
+# Desde este tamaño el HTML se recorre como flujo de eventos en lugar de DOM.
+_STREAM_PARSE_BYTES = 2 * 1024 * 1024
+_BLOCK_TAGS = frozenset({
+    "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "main", "ol", "p", "pre",
+    "section", "table", "td", "th", "tr", "ul",
+})
+
+
+def _header_charset(content_type: Optional[str]) -> Optional[str]:
+    match = _CHARSET_RE.search(content_type or "")
+    return match.group(1) if match else None
+
+
+def _sniff_encoding(content: bytes, declared: Optional[str] = None) -> str:
+    """Encoding de la página: el del header HTTP, si no el de ``<meta
+    charset>``, y sin ninguno, UTF-8 si los bytes lo son o windows-1252 (que
+    cubre Latin-1, todavía común en sitios en español)."""
+    meta = EncodingDetector.find_declared_encoding(content[:_SNIFF_BYTES], is_html=True)
+    for candidate in (declared, meta):
+        if candidate:
+            try:
+                return codecs.lookup(candidate).name
+            except LookupError:
+                pass
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        return "cp1252"
+    return "utf-8"
+
+
+def _parse_html(content: bytes, encoding: str) -> BeautifulSoup:
+    # lxml (C) parsea varias veces más rápido que html.parser. Si no está
+    # instalado o se atraganta con el HTML, volvemos al parser puro Python.
+    try:
+        return BeautifulSoup(content, "lxml", parse_only=_STRAINER, from_encoding=encoding)
+    except Exception:
+        return BeautifulSoup(content, "html.parser", parse_only=_STRAINER, from_encoding=encoding)
+
+
+@dataclass(frozen=True)
+class ParsedDoc:
+    """Resultado de parsear una página una sola vez.
+
+    ``dom`` es el árbol ya limpio (``LexborHTMLParser`` o ``BeautifulSoup``,
+    según qué parser haya podido con la página) para quien necesite algo más
+    que el texto sin volver a parsear el HTML."""
+
+    title: str
+    text: str
+    dom: Any = field(default=None, repr=False, compare=False)
+
+
+def _html_doc_lexbor(content: bytes, encoding: str) -> Optional[ParsedDoc]:
+    """Parseo con selectolax/lexbor, o None si hay que caer a bs4."""
+    if LexborHTMLParser is None:
+        return None
+    try:
+        # lexbor solo sabe leer bytes UTF-8: le damos el texto ya decodificado.
+        tree = LexborHTMLParser(content.decode(encoding, errors="replace"))
+        if tree.body is None:
+            return None
+        for node in tree.css(_NOISE_SELECTOR):
+            node.decompose()
+        text = tree.body.text(separator="\n", strip=True)
+        if not text:
+            return None
+        title_node = tree.css_first("title") or tree.css_first("h1")
+        title = title_node.text(strip=True) if title_node else ""
+    except Exception:
+        logger.warning("lexbor parse failed, falling back to bs4", exc_info=True)
+        return None
+    return ParsedDoc(title, text, tree)
+
+
+def _html_doc_soup(content: bytes, encoding: str) -> ParsedDoc:
+    soup = _parse_html(content, encoding)
+
+    for tag in soup(_NOISE_TAGS):
         tag.decompose()
 
     title = ""
@@ -69,32 +274,366 @@ def extract_url(url: str, timeout: int = 15) -> tuple[str, str]:
         h1 = soup.find("h1")
         if h1:
             title = h1.get_text(strip=True)
-    if not title:
-        title = parsed.netloc
 
-    text = soup.get_text(separator="\n", strip=True)
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    cleaned = "\n".join(lines)
-    return title, cleaned
+    return ParsedDoc(title, soup.get_text(separator="\n", strip=True), soup)
+
+
+class _TextCollector:
+    """Target SAX de lxml: recibe texto en orden de documento sin que se
+    construya ningún árbol. Salta el contenido de ``_NOISE_TAGS`` y marca un
+    salto de línea en cada borde de bloque."""
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.title: List[str] = []
+        self.h1: List[str] = []
+        self._skip = 0
+        self._in: Optional[str] = None  # "title" o el primer "h1"
+
+    def start(self, tag: str, attrib: Any) -> None:
+        if tag in _NOISE_SET:
+            self._skip += 1
+        elif tag == "title" and not self.title:
+            self._in = "title"
+        elif tag == "h1" and not self.h1:
+            self._in = "h1"
+        if tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def end(self, tag: str) -> None:
+        if tag in _NOISE_SET:
+            self._skip = max(self._skip - 1, 0)
+        elif tag == self._in:
+            self._in = None
+        if tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def data(self, data: str) -> None:
+        if self._in == "title":
+            self.title.append(data)
+            return
+        if self._skip:
+            return
+        if self._in == "h1":
+            self.h1.append(data)
+        self.parts.append(data)
+
+    def close(self) -> ParsedDoc:
+        title = "".join(self.title).strip() or "".join(self.h1).strip()
+        return ParsedDoc(title, "".join(self.parts))
+
 
+def _html_doc_stream(content: bytes, encoding: str) -> Optional[ParsedDoc]:
+    """Extracción en streaming, o None si hay que caer a lexbor/bs4."""
+    # Se alimenta por bloques: lo único que crece con la página es el texto.
+    # Decodificamos aquí, por bloques, en lugar de pasarle el encoding a
+    # libxml2: no conoce todos los nombres de codec de Python (euc_jp,
+    # euc_kr...) y sin ninguno asume Latin-1.
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    try:
+        parser = etree.HTMLParser(target=_TextCollector())
+        for i in range(0, len(content), _URL_READ_CHUNK):
+            parser.feed(decoder.decode(content[i : i + _URL_READ_CHUNK]))
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            parser.feed(tail)
+        return parser.close()
+    except Exception:
+        logger.warning("streaming parse failed, falling back to the DOM path", exc_info=True)
+        return None
 
-def extract_pdf(file_bytes: bytes) -> str:
-    if not file_bytes:
-        return ""
-    text = extract_text(BytesIO(file_bytes)) or ""
-    return text.strip()
 
+def html_to_doc(content: bytes, encoding: Optional[str] = None) -> ParsedDoc:
+    """Parsea HTML crudo: título, texto limpio (una línea no vacía por
+    bloque) y el árbol. Sin caché; ``extract_url`` cachea solo el texto.
+    ``encoding`` es el charset declarado en el Content-Type, si lo hubo.
 
-def extract_pdf_pages(file_bytes: bytes) -> List[str]:
-    """Devuelve el texto del PDF página por página (lista 1-indexada por su orden)."""
-    if not file_bytes:
+    Las páginas de más de ``_STREAM_PARSE_BYTES`` se extraen en streaming
+    (sin árbol, ``dom`` queda en None) para no cargar un DOM enorme entero."""
+    encoding = _sniff_encoding(content, encoding)
+    doc = None
+    if etree is not None and len(content) > _STREAM_PARSE_BYTES:
+        doc = _html_doc_stream(content, encoding)
+    if doc is None:
+        # Solo necesitamos texto plano: lexbor lo saca sin armar un árbol de
+        # objetos Python. bs4 queda para cuando selectolax no está, no
+        # encuentra <body> (fragmentos, páginas muy rotas) o falla.
+        doc = _html_doc_lexbor(content, encoding) or _html_doc_soup(content, encoding)
+    # Los elementos inline eliminados dejan rachas de espacios que solo gastan
+    # presupuesto de chunk y de embeddings; se colapsan en C, respetando los
+    # saltos de línea que separan bloques.
+    text = _INLINE_WS.sub(" ", doc.text)
+    lines = [stripped for ln in text.splitlines() if (stripped := ln.strip())]
+    return ParsedDoc(doc.title, "\n".join(lines), doc.dom)
+
+
+def _check_url(url: str) -> ParseResult:
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https"):
+        raise ValueError("URL inválida; debe empezar con http(s)://")
+    return parsed
+
+
+def _page_text(
+    content: bytes, fallback_title: str, charset: Optional[str] = None
+) -> Tuple[str, str]:
+    # El charset entra en la clave: los mismos bytes declarados con otro
+    # encoding dan otro texto.
+    key = ("html", hashlib.blake2b(content).digest() + (charset or "").encode())
+    page = _parsed_get(key)
+    if page is None:
+        doc = html_to_doc(content, charset)
+        page = (doc.title, doc.text)
+        _parsed_put(key, page)
+    title, cleaned = page
+    return title or fallback_title, cleaned
+
+
+def _check_content_type(content_type: Optional[str]) -> None:
+    if not content_type:
+        return
+    mime = content_type.split(";", 1)[0].strip().lower()
+    if not (mime.startswith("text/") or mime in _URL_TEXT_MIMES):
+        raise ValueError(f"La URL no devuelve una página de texto ({mime})")
+
+
+def _append_capped(buf: bytearray, chunk: bytes) -> None:
+    # El tope se mide sobre el cuerpo ya descomprimido: un gzip chico que se
+    # infla a cientos de MB también corta aquí.
+    buf.extend(chunk)
+    if len(buf) > _URL_MAX_BYTES:
+        raise ValueError(f"La página supera el límite de {_URL_MAX_BYTES // (1024 * 1024)} MB")
+
+
+def _cached_page(url: str) -> Optional[Dict[str, Any]]:
+    with _page_cache_lock:
+        entry = _page_cache.get(url)
+        if entry is not None:
+            _page_cache.move_to_end(url)
+        return entry
+
+
+def _revalidation_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if entry is None:
+        return headers
+    if entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def _remember_page(url: str, headers: Mapping[str, str], page: Tuple[str, str]) -> None:
+    global _page_cache_chars
+    cache_control = (headers.get("Cache-Control") or "").lower()
+    if "no-store" in cache_control:
+        return
+    max_age = 0
+    if "no-cache" not in cache_control:
+        match = _MAX_AGE_RE.search(cache_control)
+        max_age = int(match.group(1)) if match else 0
+    etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+    if not (etag or last_modified or max_age):
+        return
+    size = _text_chars(page)
+    if size > _PAGE_ENTRY_MAX_CHARS:
+        return
+    entry = {
+        "etag": etag,
+        "last_modified": last_modified,
+        "expires": time.monotonic() + max_age,
+        "page": page,
+        "chars": size,
+    }
+    with _page_cache_lock:
+        old = _page_cache.pop(url, None)
+        if old is not None:
+            _page_cache_chars -= old["chars"]
+        _page_cache[url] = entry
+        _page_cache_chars += size
+        while _page_cache_chars > _PAGE_CACHE_MAX_CHARS:
+            _, evicted = _page_cache.popitem(last=False)
+            _page_cache_chars -= evicted["chars"]
+
+
+def _read_body(resp: requests.Response) -> bytes:
+    _check_content_type(resp.headers.get("Content-Type"))
+    body = bytearray()
+    for chunk in resp.iter_content(_URL_READ_CHUNK):
+        _append_capped(body, chunk)
+    return bytes(body)
+
+
+def extract_url(url: str, timeout: float = 15) -> tuple[str, str]:
+    """Devuelve (título, texto_limpio) de una URL."""
+    parsed = _check_url(url)
+    cached = _cached_page(url)
+    if cached is not None and cached["expires"] > time.monotonic():
+        return cached["page"]
+    with _SESSION.get(
+        url,
+        timeout=(_CONNECT_TIMEOUT, timeout),
+        headers=_revalidation_headers(cached),
+        stream=True,
+    ) as resp:
+        if cached is not None and resp.status_code == 304:
+            return cached["page"]
+        resp.raise_for_status()
+        body = _read_body(resp)
+    page = _page_text(body, parsed.netloc, _header_charset(resp.headers.get("Content-Type")))
+    _remember_page(url, resp.headers, page)
+    return page
+
+
+async def extract_urls(
+    urls: List[str], timeout: float = 15
+) -> List[Union[Tuple[str, str], BaseException]]:
+    """Como ``extract_url`` para varias URLs a la vez.
+
+    Las descargas van en paralelo y el parseo de cada página corre en un hilo
+    mientras siguen llegando las demás. Devuelve, en el mismo orden que
+    ``urls``, ``(título, texto)`` o la excepción de esa URL."""
+    per_host: Dict[str, asyncio.Semaphore] = {}
+
+    async def one(client: httpx.AsyncClient, url: str) -> Tuple[str, str]:
+        parsed = _check_url(url)
+        cached = _cached_page(url)
+        if cached is not None and cached["expires"] > time.monotonic():
+            return cached["page"]
+        gate = per_host.setdefault(parsed.netloc, asyncio.Semaphore(_URLS_PER_HOST))
+        body = bytearray()
+        async with gate, client.stream("GET", url, headers=_revalidation_headers(cached)) as resp:
+            if cached is not None and resp.status_code == 304:
+                return cached["page"]
+            resp.raise_for_status()
+            _check_content_type(resp.headers.get("Content-Type"))
+            async for chunk in resp.aiter_bytes(_URL_READ_CHUNK):
+                _append_capped(body, chunk)
+        page = await asyncio.to_thread(
+            _page_text,
+            bytes(body),
+            parsed.netloc,
+            _header_charset(resp.headers.get("Content-Type")),
+        )
+        _remember_page(url, resp.headers, page)
+        return page
+
+    transport = httpx.AsyncHTTPTransport(
+        retries=2,
+        limits=httpx.Limits(
+            max_connections=_URLS_MAX_CONNECTIONS,
+            max_keepalive_connections=_URLS_MAX_CONNECTIONS,
+        ),
+    )
+    async with httpx.AsyncClient(
+        transport=transport,
+        headers={"User-Agent": _USER_AGENT},
+        timeout=httpx.Timeout(timeout, connect=_CONNECT_TIMEOUT),
+        follow_redirects=True,
+    ) as client:
+        return await asyncio.gather(*(one(client, url) for url in urls), return_exceptions=True)
+
+
+PdfSource = Union[bytes, str]
+
+
+def _open_pdf(source: PdfSource) -> pymupdf.Document:
+    """Abre un PDF desde bytes en memoria o desde una ruta en disco."""
+    if isinstance(source, (bytes, bytearray)):
+        return pymupdf.open(stream=source, filetype="pdf")
+    return pymupdf.open(source, filetype="pdf")
+
+
+def extract_pdf(source: PdfSource) -> str:
+    return "\n".join(extract_pdf_pages(source)).strip()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # "spawn": el proceso padre corre hilos (uvicorn, threadpool), y
+            # hacer fork con hilos vivos puede dejar locks tomados en el hijo.
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_pool
+
+
+def _discard_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    # Un pool roto (worker muerto por el OOM killer, por ejemplo) rechaza todo
+    # submit posterior: se descarta para que el próximo PDF arme uno nuevo.
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_page_range(source: PdfSource, start: int, stop: int) -> List[str]:
+    # Cada worker abre su propio documento: los objetos de MuPDF no se comparten
+    # entre procesos. Con una ruta, además, no serializamos el PDF completo.
+    with _open_pdf(source) as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+
+def _pdf_digest(source: PdfSource) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.blake2b(source).digest()
+    with open(source, "rb") as fh:
+        return hashlib.file_digest(fh, "blake2b").digest()
+
+
+def extract_pdf_pages(source: PdfSource) -> List[str]:
+    """Devuelve el texto del PDF página por página (lista 1-indexada por su orden).
+
+    ``source`` son los bytes del PDF o la ruta a un archivo. Usa PyMuPDF
+    (MuPDF, en C): varias veces más rápido que pdfminer.six y sin construir
+    un objeto Python por carácter. Con varios núcleos y al menos
+    ``_PDF_PARALLEL_MIN_PAGES`` páginas, los rangos de páginas se extraen en
+    paralelo en un pool de procesos. Un PDF idéntico a uno ya extraído (el
+    mismo material que sube todo el grupo) sale del caché por contenido.
+    """
+    if not source:
         return []
-    full = extract_text(BytesIO(file_bytes)) or ""
-    if not full:
+    key = ("pdf", _pdf_digest(source))
+    pages = _parsed_get(key)
+    if pages is None:
+        pages = tuple(_extract_pdf_pages(source))
+        _parsed_put(key, pages)
+    return list(pages)
+
+
+def _extract_pdf_parallel(source: PdfSource, page_count: int, workers: int) -> List[str]:
+    step = math.ceil(page_count / workers)
+    pool = _get_pdf_pool()
+    try:
+        futures = [
+            pool.submit(_extract_page_range, source, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        return [text for fut in futures for text in fut.result()]
+    except BrokenProcessPool:
+        # Si un worker se quedó sin memoria, reintentar en paralelo volvería a
+        # tumbarlo: este PDF se extrae aquí mismo.
+        logger.warning("PDF worker pool broke, extracting in-process", exc_info=True)
+        _discard_pdf_pool(pool)
+        return _extract_page_range(source, 0, page_count)
+
+
+def _extract_pdf_pages(source: PdfSource) -> List[str]:
+    with _open_pdf(source) as doc:
+        if doc.needs_pass:
+            # Sin esto cada worker reabriría el PDF solo para fallar igual.
+            raise ValueError("El PDF está protegido con contraseña")
+        page_count = doc.page_count
+        workers = min(PDF_WORKERS, page_count) if page_count >= _PDF_PARALLEL_MIN_PAGES else 1
+        if workers <= 1:
+            pages = [page.get_text("text") for page in doc]
+    if workers > 1:
+        pages = _extract_pdf_parallel(source, page_count, workers)
+    if not any(p.strip() for p in pages):
         return []
-    # pdfminer separa páginas con form-feed (\f) por default.
-    pages = full.split("\f")
-    # La última página suele venir vacía por el \f final.
-    while pages and not pages[-1].strip():
-        pages.pop()
     return pages
@@ -1,9 +1,16 @@
 """Cliente unificado para OpenAI, Anthropic y Google Gemini con SDK moderno."""
-from typing import List, Optional, Dict, Any
-from openai import OpenAI
-from anthropic import Anthropic
-from google import genai
-from google.genai import types as genai_types
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from anthropic import Anthropic, AsyncAnthropic
+
+# google-genai tarda más de medio segundo en importarse (sus tipos son enormes)
+# y solo hace falta si alguien elige un modelo Gemini: se importa al primer uso.
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types as genai_types
 
 from config import (
     OPENAI_API_KEY,
@@ -18,6 +25,9 @@ from config import (
 _openai_client: Optional[OpenAI] = None
 _anthropic_client: Optional[Anthropic] = None
 _google_client: Optional[genai.Client] = None
+_async_openai_client: Optional[AsyncOpenAI] = None
+_async_anthropic_client: Optional[AsyncAnthropic] = None
+_async_http: Optional[httpx.AsyncClient] = None
 
 
 def get_openai() -> OpenAI:
@@ -43,33 +53,183 @@ def get_google() -> genai.Client:
     if _google_client is None:
         if not GOOGLE_API_KEY:
             raise RuntimeError("GOOGLE_API_KEY no configurada")
+        from google import genai
+
         _google_client = genai.Client(api_key=GOOGLE_API_KEY)
     return _google_client
 
 
+def _get_async_http() -> httpx.AsyncClient:
+    """Pool HTTP/2 compartido por los clientes async: las conexiones TLS con
+    cada proveedor se reutilizan entre requests en lugar de renegociarse.
+    Los timeouts por request los sigue poniendo cada SDK."""
+    global _async_http
+    if _async_http is None:
+        _async_http = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(600.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+        )
+    return _async_http
+
+
+async def aclose() -> None:
+    """Cierra el pool async (se llama al apagar la app)."""
+    global _async_http, _async_openai_client, _async_anthropic_client
+    if _async_http is not None:
+        await _async_http.aclose()
+    _async_http = None
+    _async_openai_client = None
+    _async_anthropic_client = None
+
+
+def get_async_openai() -> AsyncOpenAI:
+    global _async_openai_client
+    if _async_openai_client is None:
+        if not OPENAI_API_KEY:
+            raise RuntimeError("OPENAI_API_KEY no configurada")
+        _async_openai_client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY, http_client=_get_async_http()
+        )
+    return _async_openai_client
+
+
+def get_async_anthropic() -> AsyncAnthropic:
+    global _async_anthropic_client
+    if _async_anthropic_client is None:
+        if not ANTHROPIC_API_KEY:
+            raise RuntimeError("ANTHROPIC_API_KEY no configurada")
+        _async_anthropic_client = AsyncAnthropic(
+            api_key=ANTHROPIC_API_KEY, http_client=_get_async_http()
+        )
+    return _async_anthropic_client
+
+
 def resolve_style(style: str) -> Optional[str]:
     return STYLE_PROMPTS.get(style)
 
 
+# System prompt final por estilo, armado una sola vez al importar en lugar de
+# concatenar BASE_SYSTEM con el overlay en cada request.
+_SYSTEM_MESSAGES: Dict[str, str] = {
+    style: f"{BASE_SYSTEM}\n\n---\n\n{overlay}" if overlay else BASE_SYSTEM
+    for style, overlay in STYLE_PROMPTS.items()
+}
+
+
 def build_system_message(style: str) -> str:
     """BASE_SYSTEM siempre, con el overlay del estilo si lo hay."""
-    overlay = STYLE_PROMPTS.get(style)
-    if overlay:
-        return f"{BASE_SYSTEM}\n\n---\n\n{overlay}"
-    return BASE_SYSTEM
+    return _SYSTEM_MESSAGES.get(style, BASE_SYSTEM)
+
+
+_RAG_PREAMBLE = (
+    "Contexto proporcionado por el docente (úsalo como fuente principal y cita "
+    "explícitamente cuando lo uses; si la pregunta no se responde con este contexto, "
+    "dilo en lugar de inventar):"
+)
 
 
 def build_rag_prompt(user_prompt: str, context_blocks: List[str]) -> str:
     if not context_blocks:
         return user_prompt
-    context = "\n\n".join(context_blocks)
-    return (
-        "Contexto proporcionado por el docente (úsalo como fuente principal y cita "
-        "explícitamente cuando lo uses; si la pregunta no se responde con este contexto, "
-        "dilo en lugar de inventar):\n\n"
-        f"{context}\n\n"
-        f"Pregunta: {user_prompt}"
-    )
+    # Un solo join: el contexto no se materializa como string intermedio antes
+    # de copiarse otra vez dentro del prompt final.
+    return "\n\n".join((_RAG_PREAMBLE, *context_blocks, f"Pregunta: {user_prompt}"))
+
+
+def _openai_kwargs(
+    model: str,
+    system_message: str,
+    user_content: str,
+    *,
+    temperature: float,
+    top_p: float,
+    frequency_penalty: float,
+    presence_penalty: float,
+    max_tokens: int,
+    stop_sequences: Optional[List[str]],
+) -> Dict[str, Any]:
+    messages = []
+    if system_message:
+        messages.append({"role": "system", "content": system_message})
+    messages.append({"role": "user", "content": user_content})
+
+    kwargs: Dict[str, Any] = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "top_p": top_p,
+        "frequency_penalty": frequency_penalty,
+        "presence_penalty": presence_penalty,
+        "max_tokens": max_tokens,
+    }
+    if stop_sequences:
+        kwargs["stop"] = stop_sequences
+    return kwargs
+
+
+def _anthropic_kwargs(
+    model: str,
+    system_message: str,
+    user_content: str,
+    *,
+    temperature: float,
+    max_tokens: int,
+    stop_sequences: Optional[List[str]],
+) -> Dict[str, Any]:
+    anthropic_model = {
+        "claude-haiku-4-5":  "claude-haiku-4-5-20251001",
+    }.get(model, model)
+
+    # Anthropic 4.x rechaza enviar `temperature` y `top_p` simultáneamente.
+    # Priorizamos `temperature` por ser la perilla principal del laboratorio.
+    kwargs: Dict[str, Any] = {
+        "model": anthropic_model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": [{"role": "user", "content": user_content}],
+    }
+    if system_message:
+        kwargs["system"] = system_message
+    if stop_sequences:
+        kwargs["stop_sequences"] = stop_sequences
+    return kwargs
+
+
+def _google_config(
+    system_message: str,
+    *,
+    temperature: float,
+    top_p: float,
+    max_tokens: int,
+    stop_sequences: Optional[List[str]],
+) -> genai_types.GenerateContentConfig:
+    from google.genai import types as genai_types
+
+    cfg_kwargs: Dict[str, Any] = {
+        "temperature": temperature,
+        "top_p": top_p,
+        "max_output_tokens": max_tokens,
+    }
+    if system_message:
+        cfg_kwargs["system_instruction"] = system_message
+    if stop_sequences:
+        cfg_kwargs["stop_sequences"] = stop_sequences
+    return genai_types.GenerateContentConfig(**cfg_kwargs)
+
+
+def _google_meta(resp: Any) -> Dict[str, Any]:
+    usage = getattr(resp, "usage_metadata", None)
+    finish = None
+    candidates = getattr(resp, "candidates", None) or []
+    if candidates:
+        fr = getattr(candidates[0], "finish_reason", None)
+        finish = getattr(fr, "name", None) or (str(fr) if fr is not None else None)
+    return {
+        "input_tokens": getattr(usage, "prompt_token_count", None) if usage else None,
+        "output_tokens": getattr(usage, "candidates_token_count", None) if usage else None,
+        "finish_reason": finish,
+    }
 
 
 def generate(
@@ -97,22 +257,17 @@ def generate(
 
     if provider == "openai":
         client = get_openai()
-        messages = []
-        if system_message:
-            messages.append({"role": "system", "content": system_message})
-        messages.append({"role": "user", "content": user_content})
-
-        kwargs: Dict[str, Any] = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "top_p": top_p,
-            "frequency_penalty": frequency_penalty,
-            "presence_penalty": presence_penalty,
-            "max_tokens": max_tokens,
-        }
-        if stop_sequences:
-            kwargs["stop"] = stop_sequences
+        kwargs = _openai_kwargs(
+            model,
+            system_message,
+            user_content,
+            temperature=temperature,
+            top_p=top_p,
+            frequency_penalty=frequency_penalty,
+            presence_penalty=presence_penalty,
+            max_tokens=max_tokens,
+            stop_sequences=stop_sequences,
+        )
         if return_logprobs:
             kwargs["logprobs"] = True
             kwargs["top_logprobs"] = max(1, min(int(top_logprobs), 5))
@@ -146,23 +301,14 @@ def generate(
 
     if provider == "anthropic":
         client = get_anthropic()
-        anthropic_model = {
-            "claude-haiku-4-5":  "claude-haiku-4-5-20251001",
-        }.get(model, model)
-
-        # Anthropic 4.x rechaza enviar `temperature` y `top_p` simultáneamente.
-        # Priorizamos `temperature` por ser la perilla principal del laboratorio.
-        kwargs = {
-            "model": anthropic_model,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "messages": [{"role": "user", "content": user_content}],
-        }
-        if system_message:
-            kwargs["system"] = system_message
-        if stop_sequences:
-            kwargs["stop_sequences"] = stop_sequences
-
+        kwargs = _anthropic_kwargs(
+            model,
+            system_message,
+            user_content,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stop_sequences=stop_sequences,
+        )
         resp = client.messages.create(**kwargs)
         text_parts = [b.text for b in resp.content if getattr(b, "type", None) == "text"]
         return {
@@ -176,36 +322,124 @@ def generate(
 
     if provider == "google":
         client = get_google()
-        cfg_kwargs: Dict[str, Any] = {
-            "temperature": temperature,
-            "top_p": top_p,
-            "max_output_tokens": max_tokens,
-        }
-        if system_message:
-            cfg_kwargs["system_instruction"] = system_message
-        if stop_sequences:
-            cfg_kwargs["stop_sequences"] = stop_sequences
-
         resp = client.models.generate_content(
             model=model,
             contents=user_content,
-            config=genai_types.GenerateContentConfig(**cfg_kwargs),
+            config=_google_config(
+                system_message,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+                stop_sequences=stop_sequences,
+            ),
         )
-
-        usage = getattr(resp, "usage_metadata", None)
-        finish = None
-        candidates = getattr(resp, "candidates", None) or []
-        if candidates:
-            fr = getattr(candidates[0], "finish_reason", None)
-            finish = getattr(fr, "name", None) or (str(fr) if fr is not None else None)
-
         return {
             "text": resp.text or "",
             "model": model,
-            "input_tokens": getattr(usage, "prompt_token_count", None) if usage else None,
-            "output_tokens": getattr(usage, "candidates_token_count", None) if usage else None,
-            "finish_reason": finish,
+            **_google_meta(resp),
             "logprobs": None,
         }
 
     raise RuntimeError(f"Proveedor no soportado: {provider}")
+
+
+async def astream(
+    *,
+    model: str,
+    prompt: str,
+    style: str,
+    temperature: float,
+    top_p: float,
+    frequency_penalty: float,
+    presence_penalty: float,
+    max_tokens: int,
+    stop_sequences: Optional[List[str]],
+    context_blocks: List[str],
+) -> AsyncIterator[Dict[str, Any]]:
+    """Igual que ``generate`` pero entrega el texto conforme llega.
+
+    Usa los clientes asíncronos de cada SDK para no bloquear el event loop
+    mientras esperamos tokens. Emite ``{"text": delta}`` por cada fragmento y
+    cierra con un único evento ``{"done": True, ...}`` que lleva modelo, uso
+    y finish_reason.
+    """
+    if model not in SUPPORTED_MODELS:
+        model = DEFAULT_MODEL
+
+    provider = SUPPORTED_MODELS[model]["provider"]
+    system_message = build_system_message(style)
+    user_content = build_rag_prompt(prompt, context_blocks)
+    meta: Dict[str, Any] = {"input_tokens": None, "output_tokens": None, "finish_reason": None}
+
+    if provider == "openai":
+        client = get_async_openai()
+        kwargs = _openai_kwargs(
+            model,
+            system_message,
+            user_content,
+            temperature=temperature,
+            top_p=top_p,
+            frequency_penalty=frequency_penalty,
+            presence_penalty=presence_penalty,
+            max_tokens=max_tokens,
+            stop_sequences=stop_sequences,
+        )
+        resp = await client.chat.completions.create(
+            **kwargs, stream=True, stream_options={"include_usage": True}
+        )
+        async for chunk in resp:
+            # El último chunk trae sólo `usage` y ninguna choice.
+            if chunk.usage:
+                meta["input_tokens"] = chunk.usage.prompt_tokens
+                meta["output_tokens"] = chunk.usage.completion_tokens
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                meta["finish_reason"] = choice.finish_reason
+            if choice.delta and choice.delta.content:
+                yield {"text": choice.delta.content}
+
+    elif provider == "anthropic":
+        client = get_async_anthropic()
+        kwargs = _anthropic_kwargs(
+            model,
+            system_message,
+            user_content,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stop_sequences=stop_sequences,
+        )
+        async with client.messages.stream(**kwargs) as s:
+            async for text in s.text_stream:
+                if text:
+                    yield {"text": text}
+            final = await s.get_final_message()
+        meta["input_tokens"] = final.usage.input_tokens
+        meta["output_tokens"] = final.usage.output_tokens
+        meta["finish_reason"] = final.stop_reason
+
+    elif provider == "google":
+        client = get_google()
+        last = None
+        async for chunk in await client.aio.models.generate_content_stream(
+            model=model,
+            contents=user_content,
+            config=_google_config(
+                system_message,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+                stop_sequences=stop_sequences,
+            ),
+        ):
+            last = chunk
+            if chunk.text:
+                yield {"text": chunk.text}
+        if last is not None:
+            meta.update(_google_meta(last))
+
+    else:
+        raise RuntimeError(f"Proveedor no soportado: {provider}")
+
+    yield {"done": True, "model": model, **meta}
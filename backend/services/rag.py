@@ -1,6 +1,10 @@
 """Capa RAG sobre ChromaDB persistente, scoped por sesión."""
+import functools
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Iterable, List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import threading
 import uuid
 
 import chromadb
@@ -9,15 +13,28 @@ from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 
 from config import (
     CHROMA_DB_PATH,
+    EMBEDDING_BATCH_SIZE,
     EMBEDDING_MODEL,
     OPENAI_API_KEY,
 )
 
 _client = None
 _embedding_fn = None
+_EMBED_WORKERS = 4
 
+# Vecinos ya resueltos por (sesión, prompt, n). El corpus de una sesión cambia
+# poco y los prompts se repiten mucho (el mismo ejercicio en todo el grupo), así
+# que servirlos desde aquí evita el recorrido del índice HNSW. Se invalida por
+# sesión en cada escritura o borrado de su colección.
+_NEIGHBORS_MAX = 512
+_neighbors: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+# Cada invalidación sube la generación de la sesión. Una query que arrancó
+# antes (y pudo ver la colección vieja) no guarda su resultado al terminar.
+_generations: Dict[str, int] = {}
+_neighbors_lock = threading.Lock()
 
-def _get_client():
+
+def get_client():
     global _client
     if _client is None:
         _client = chromadb.PersistentClient(
@@ -41,6 +58,41 @@ def _get_embedding_fn():
     return _embedding_fn
 
 
+@functools.lru_cache(maxsize=4096)
+def _embed_cached(text: str) -> array:
+    # float32 contiguo: ~6 KB por vector de 1536 dimensiones contra ~48 KB como
+    # tupla de floats de Python; con el LRU lleno son ~25 MB y no ~190 MB en el
+    # plan de 512 MB. Nunca sale de aquí: ``embed`` devuelve una copia.
+    return array("f", _get_embedding_fn()([text])[0])
+
+
+def embed(text: str) -> List[float]:
+    """Embedding de un solo texto con el mismo modelo que usa el RAG.
+
+    Los prompts repetidos (el mismo ejercicio en todo el grupo) salen de un
+    LRU en memoria en lugar de volver a llamar al endpoint de embeddings."""
+    return _embed_cached(text).tolist()
+
+
+def embed_many(texts: List[str]) -> List[Any]:
+    """Embeddings de muchos textos: un ``input=[...]`` por lote de
+    ``EMBEDDING_BATCH_SIZE`` y, si hay varios lotes, en paralelo.
+
+    Mantiene cada request por debajo del límite de inputs/tokens del endpoint
+    de embeddings aun con PDFs largos."""
+    if not texts:
+        return []
+    fn = _get_embedding_fn()
+    batches = [
+        texts[i : i + EMBEDDING_BATCH_SIZE]
+        for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+    if len(batches) == 1:
+        return list(fn(batches[0]))
+    with ThreadPoolExecutor(max_workers=min(_EMBED_WORKERS, len(batches))) as pool:
+        return [vec for batch in pool.map(fn, batches) for vec in batch]
+
+
 def _collection_name(session_id: str) -> str:
     safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
     return f"docente_{safe}"[:60]
@@ -59,7 +111,7 @@ def _get_collection(session_id: str, *, require_embeddings: bool = True):
     }
     if require_embeddings:
         kwargs["embedding_function"] = _get_embedding_fn()
-    return _get_client().get_or_create_collection(**kwargs)
+    return get_client().get_or_create_collection(**kwargs)
 
 
 def add_chunks(
@@ -71,10 +123,12 @@ def add_chunks(
     source_type: str,
     source_ref: str,
     pages: Optional[List[int]] = None,
+    embeddings: Optional[List[Any]] = None,
 ) -> int:
     """Indexa chunks. ``pages`` (opcional, mismo largo que ``chunks``) lleva el
     número de página REAL del PDF; para texto/URL se omite y mostramos el
-    índice de fragmento."""
+    índice de fragmento. ``embeddings`` permite pasar vectores ya calculados
+    (p. ej. por la Batch API) en lugar de pedirlos aquí."""
     if not chunks:
         return 0
     collection = _get_collection(session_id)
@@ -82,29 +136,40 @@ def add_chunks(
     doc_id = str(uuid.uuid4())[:8]
     total = len(chunks)
     ids = [f"{doc_id}_{i}" for i in range(total)]
-    metadatas = []
-    for i in range(total):
-        meta = {
-            "title": title or "Sin título",
-            "author": author or "Autor desconocido",
-            "source_type": source_type,
-            "source_ref": source_ref,
-            "chunk_index": i,
-            "total_chunks": total,
-            "uploaded_at": now,
-        }
-        if pages and i < len(pages) and pages[i]:
-            meta["page"] = int(pages[i])
-        metadatas.append(meta)
-    collection.add(documents=chunks, metadatas=metadatas, ids=ids)
+    # Lo común a todos los chunks se arma una vez; por chunk solo cambia el índice.
+    base = {
+        "title": title or "Sin título",
+        "author": author or "Autor desconocido",
+        "source_type": source_type,
+        "source_ref": source_ref,
+        "total_chunks": total,
+        "uploaded_at": now,
+    }
+    metadatas = [{**base, "chunk_index": i} for i in range(total)]
+    if pages:
+        for meta, page in zip(metadatas, pages):
+            if page:
+                meta["page"] = int(page)
+    collection.add(
+        documents=chunks,
+        embeddings=embeddings if embeddings is not None else embed_many(chunks),
+        metadatas=metadatas,
+        ids=ids,
+    )
+    _forget_neighbors(session_id)
     return total
 
 
-def query(session_id: str, prompt: str, n_results: int = 4) -> Dict[str, Any]:
+def _query_live(session_id: str, prompt: str, n_results: int) -> Dict[str, Any]:
     collection = _get_collection(session_id)
-    if collection.count() == 0:
+    count = collection.count()
+    if count == 0:
         return {"chunks": [], "metadatas": [], "distances": []}
-    res = collection.query(query_texts=[prompt], n_results=min(n_results, collection.count()))
+    res = collection.query(
+        query_embeddings=[embed(prompt)],
+        n_results=min(n_results, count),
+        include=["documents", "metadatas", "distances"],
+    )
     return {
         "chunks": res.get("documents", [[]])[0],
         "metadatas": res.get("metadatas", [[]])[0],
@@ -112,6 +177,40 @@ def query(session_id: str, prompt: str, n_results: int = 4) -> Dict[str, Any]:
     }
 
 
+def _generation(session_id: str) -> int:
+    with _neighbors_lock:
+        return _generations.get(session_id, 0)
+
+
+def _remember_neighbors(
+    key: Tuple[str, str, int], result: Dict[str, Any], generation: int
+) -> None:
+    with _neighbors_lock:
+        if _generations.get(key[0], 0) != generation:
+            return
+        if key not in _neighbors and len(_neighbors) >= _NEIGHBORS_MAX:
+            _neighbors.pop(next(iter(_neighbors)))
+        _neighbors[key] = result
+
+
+def _forget_neighbors(session_id: str) -> None:
+    with _neighbors_lock:
+        _generations[session_id] = _generations.get(session_id, 0) + 1
+        for key in [k for k in _neighbors if k[0] == session_id]:
+            del _neighbors[key]
+
+
+def query(session_id: str, prompt: str, n_results: int = 4) -> Dict[str, Any]:
+    key = (session_id, prompt, n_results)
+    hit = _neighbors.get(key)
+    if hit is not None:
+        return hit
+    generation = _generation(session_id)
+    result = _query_live(session_id, prompt, n_results)
+    _remember_neighbors(key, result, generation)
+    return result
+
+
 _PLACEHOLDER_AUTHORS = {"", "autor desconocido", "pdf", "url"}
 
 
@@ -162,9 +261,12 @@ def status(session_id: str) -> Dict[str, Any]:
 def clear(session_id: str) -> None:
     name = _collection_name(session_id)
     try:
-        _get_client().delete_collection(name=name)
+        get_client().delete_collection(name=name)
     except Exception:
         pass
+    # Después del borrado: una query concurrente que aún vio los chunks no
+    # puede volver a dejarlos en memoria.
+    _forget_neighbors(session_id)
 
 
 def format_context_blocks(retrieved: Dict[str, Any]) -> List[str]:
@@ -12,6 +12,7 @@ from __future__ import annotations
 import json
 import sys
 import time
+import uuid
 from typing import Any
 
 import requests
@@ -38,6 +39,14 @@ def show(label: str, payload: Any, max_chars: int = 600) -> None:
     print(f"\n▸ {label}\n{text}")
 
 
+def check(label: str, ok: bool) -> None:
+    print(f"{'✓' if ok else '❌'} {label}")
+
+
+def openai_configured() -> bool:
+    return bool(requests.get(f"{BASE}/health", timeout=5).json().get("openai_configured"))
+
+
 # ──────────────────────────────────────────────────────────────────────
 # Sesión HTTP — preserva el header X-Session-Id entre requests, igual
 # que hace el frontend con localStorage.
@@ -312,12 +321,132 @@ def test_logprobs_anthropic_silently_ignored() -> None:
     print(f"\nlogprobs en respuesta Anthropic: {res.get('logprobs')!r}  (esperado: None)")
 
 
+def test_generate_stream() -> None:
+    banner("9 · /api/generate/stream — tiempo al primer token")
+    payload = {
+        "prompt": "Explica en un párrafo qué es la evaluación formativa.",
+        "model": "gpt-4o-mini",
+        "style": "natural",
+        "temperature": 0.7,
+        "max_tokens": 200,
+    }
+    headers = {SESSION_HEADER: _sid["value"]} if _sid["value"] else {}
+    started = time.perf_counter()
+    first_token_ms = None
+    parts: list = []
+    final: dict = {}
+    with session.post(
+        f"{BASE}/api/generate/stream", json=payload, headers=headers, stream=True, timeout=TIMEOUT
+    ) as resp:
+        print(f"[POST /api/generate/stream] → {resp.status_code}")
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if "token" in event:
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                parts.append(event["token"])
+            elif event.get("done"):
+                final = event
+            elif "error" in event:
+                print(f"  error: {event['error']}")
+    total_ms = (time.perf_counter() - started) * 1000
+    print(f"  primer token: {first_token_ms or 0:.0f} ms · total: {total_ms:.0f} ms · {len(parts)} eventos")
+    show("texto reconstruido", "".join(parts), max_chars=300)
+    show("evento final", final)
+
+
+def test_generate_cached() -> None:
+    banner("10 · /api/generate dos veces a temperatura 0 — caché semántico")
+    # El caché guarda respuestas por días y compara prompts por similitud: un
+    # nonce en el prompt no alcanza. Una stop sequence que nunca aparece entra
+    # en la clave exacta del caché, así cada corrida arranca sin entrada previa.
+    payload = {
+        "prompt": "Define en una oración qué es una rúbrica analítica.",
+        "model": "gpt-4o-mini",
+        "style": "natural",
+        "temperature": 0.0,
+        "max_tokens": 80,
+        "stop_sequences": [f"<smoke-{uuid.uuid4().hex}>"],
+    }
+    first = call("POST", "/api/generate", json=payload)
+    second = call("POST", "/api/generate", json=payload)
+    if not openai_configured():
+        print("Sin OPENAI_API_KEY el modo de prueba no pasa por el caché: no hay campo 'cached'.")
+        check("sin campo 'cached'", "cached" not in first and "cached" not in second)
+        return
+    print("Con RESPONSE_CACHE_ENABLED=1 (default) la segunda debe salir del caché.")
+    check(f"primera cached={first.get('cached')!r} (esperado False)", first.get("cached") is False)
+    check(f"segunda cached={second.get('cached')!r} (esperado True)", second.get("cached") is True)
+    check("misma respuesta", first.get("response") == second.get("response"))
+
+
+def test_upload_urls() -> None:
+    banner("11 · /api/upload-urls — una URL buena y una caída")
+    good = "https://es.wikipedia.org/wiki/Evaluaci%C3%B3n_formativa"
+    bad = "https://no-existe.invalid/pagina"
+    res = call("POST", "/api/upload-urls", json={"urls": [good, bad], "chunk_size": 1000})
+    if res.get("_status") == 503 and not openai_configured():
+        # La página bajó, pero sin clave no hay embeddings para indexarla.
+        check("sin OPENAI_API_KEY → 503 al indexar", True)
+        return
+    show("respuesta", res)
+    results = res.get("results") or []
+    check("un resultado por URL, en orden", [r.get("url") for r in results] == [good, bad])
+    if len(results) != 2:
+        return
+    ok, failed = results
+    check(
+        f"URL buena → {ok.get('status')} (esperado success con chunks_created y metadata)",
+        ok.get("status") == "success" and ok.get("chunks_created", 0) > 0 and "metadata" in ok,
+    )
+    check("URL caída → error con detail", failed.get("status") == "error" and bool(failed.get("detail")))
+    check(
+        "chunks_created total = suma por URL",
+        res.get("chunks_created") == sum(r.get("chunks_created", 0) for r in results),
+    )
+
+
+def test_ingest_job_unknown() -> None:
+    banner("12 · /api/ingest-jobs/{id} con un id inexistente")
+    res = call("GET", "/api/ingest-jobs/batch_no_existe")
+    check(f"404 (recibido {res.get('_status')})", res.get("_status") == 404)
+
+
 def test_clear_rag() -> None:
-    banner("9 · Limpiar fuentes de mi sesión")
+    banner("13 · Limpiar fuentes de mi sesión")
     show("/api/clear-rag", call("DELETE", "/api/clear-rag"))
     show("/api/rag-status", call("GET", "/api/rag-status"))
 
 
+def test_batch() -> None:
+    banner("14 · /api/batch — status por sub-llamada")
+    # Corre con el RAG ya vacío: verify-claims responde 400 sin llamar al
+    # modelo si hay clave, y 503 si no la hay.
+    expected = {
+        "config": 200,
+        "unknown": 404,
+        "invalid": 422,
+        "verify": 400 if openai_configured() else 503,
+    }
+    res = call("POST", "/api/batch", json={"requests": [
+        {"id": "config", "method": "GET", "url": "/api/config"},
+        {"id": "unknown", "method": "GET", "url": "/api/no-existe"},
+        {"id": "invalid", "method": "POST", "url": "/api/tokenize", "body": {}},
+        {"id": "verify", "method": "POST", "url": "/api/verify-claims", "body": {"response_text": "Hola."}},
+    ]})
+    show("respuesta", res)
+    responses = res.get("responses") or []
+    check("mismo orden que la petición", [r.get("id") for r in responses] == list(expected))
+    for r in responses:
+        want = expected.get(r.get("id"))
+        check(f"{r.get('id')}: status {r.get('status')} (esperado {want})", r.get("status") == want)
+        check(f"{r.get('id')}: trae body", isinstance(r.get("body"), dict))
+        if r.get("status", 200) >= 400:
+            check(f"{r.get('id')}: body con detail", "detail" in (r.get("body") or {}))
+
+
 # ──────────────────────────────────────────────────────────────────────
 # Main
 # ──────────────────────────────────────────────────────────────────────
@@ -345,7 +474,12 @@ def main() -> int:
     test_session_isolation()
     test_logprobs()
     test_logprobs_anthropic_silently_ignored()
+    test_generate_stream()
+    test_generate_cached()
+    test_upload_urls()
+    test_ingest_job_unknown()
     test_clear_rag()
+    test_batch()
 
     banner("FIN")
     print("Si llegaste hasta aquí sin errores rojos arriba, el laboratorio responde como debe.")
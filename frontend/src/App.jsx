@@ -48,15 +48,23 @@ export default function App() {
   const [returnLogprobs, setReturnLogprobs] = useState(false);
 
   useEffect(() => {
+    // Config pública y estado del RAG en un solo viaje al backend.
     api
-      .publicConfig()
-      .then((cfg) => {
-        setModels(cfg.models || []);
-        setModel(cfg.default_model || 'claude-sonnet-4-6');
-        setDefaultModel(cfg.default_model || 'claude-sonnet-4-6');
+      .batch([
+        { id: 'config', method: 'GET', url: '/api/config' },
+        { id: 'rag', method: 'GET', url: '/api/rag-status' },
+      ])
+      .then(({ responses }) => {
+        const byId = Object.fromEntries(responses.map((r) => [r.id, r]));
+        if (byId.config?.status === 200) {
+          const cfg = byId.config.body;
+          setModels(cfg.models || []);
+          setModel(cfg.default_model || 'claude-sonnet-4-6');
+          setDefaultModel(cfg.default_model || 'claude-sonnet-4-6');
+        }
+        if (byId.rag?.status === 200) setRagStatus(byId.rag.body);
       })
       .catch(() => {});
-    refreshRag();
   }, []);
 
   const refreshRag = () => {
@@ -78,7 +86,7 @@ export default function App() {
         .split(',')
         .map((s) => s.trim())
         .filter(Boolean);
-      const data = await api.generate({
+      const body = {
         prompt,
         model,
         style,
@@ -87,7 +95,19 @@ export default function App() {
         use_rag: useRag,
         return_logprobs: returnLogprobs,
         top_logprobs: 3,
-      });
+      };
+      let data;
+      if (returnLogprobs) {
+        // Los logprobs sólo vienen en la respuesta completa, sin streaming.
+        data = await api.generate(body);
+      } else {
+        let text = '';
+        const final = await api.generateStream(body, (token) => {
+          text += token;
+          setResult({ response: text, model, chunks_used: 0, sources: [] });
+        });
+        data = { ...final, response: text };
+      }
       setResult(data);
       saveEntry({
         kind: 'Laboratorio',
@@ -32,10 +32,52 @@ const fetchJson = async (path, options = {}) => {
   return res.json();
 };
 
+// Consume el SSE de /api/generate/stream: llama a onToken con cada fragmento
+// y resuelve con el evento final (fuentes, uso, finish_reason).
+const streamSse = async (path, body, onToken) => {
+  const res = await fetch(`${API_BASE}${path}`, {
+    method: 'POST',
+    headers: buildHeaders(),
+    body: JSON.stringify(body),
+  });
+  syncSessionFromResponse(res);
+  if (!res.ok) {
+    let detail = res.statusText;
+    try {
+      const data = await res.json();
+      detail = data.detail || detail;
+    } catch (_) {}
+    throw new Error(detail);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let final = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      if (!raw.startsWith('data: ')) continue;
+      const event = JSON.parse(raw.slice(6));
+      if (event.error) throw new Error(event.error);
+      if (event.done) final = event;
+      else if (event.token) onToken(event.token);
+    }
+  }
+  if (!final) throw new Error('La respuesta se interrumpió antes de terminar');
+  return final;
+};
+
 export const api = {
   publicConfig: () => fetchJson('/api/config'),
   generate: (body) =>
     fetchJson('/api/generate', { method: 'POST', body: JSON.stringify(body) }),
+  generateStream: (body, onToken) => streamSse('/api/generate/stream', body, onToken),
   compare: (body) =>
     fetchJson('/api/compare', { method: 'POST', body: JSON.stringify(body) }),
   tokenize: (body) =>
@@ -49,6 +91,8 @@ export const api = {
     fetchJson('/api/upload-text', { method: 'POST', body: JSON.stringify(body) }),
   uploadUrl: (body) =>
     fetchJson('/api/upload-url', { method: 'POST', body: JSON.stringify(body) }),
+  uploadUrls: (body) =>
+    fetchJson('/api/upload-urls', { method: 'POST', body: JSON.stringify(body) }),
   uploadPdf: async (file) => {
     const fd = new FormData();
     fd.append('file', file);
@@ -69,5 +113,8 @@ export const api = {
     return res.json();
   },
   ragStatus: () => fetchJson('/api/rag-status'),
+  // Varias llamadas en un solo viaje: [{ id, method, url, body }] → { responses }.
+  batch: (requests) =>
+    fetchJson('/api/batch', { method: 'POST', body: JSON.stringify({ requests }) }),
   clearRag: () => fetchJson('/api/clear-rag', { method: 'DELETE', _json: false }),
 };
@@ -23,6 +23,7 @@ export default function ResponsePanel({ result, useRag, loading, ragHasContent,
             {result.finish_reason && (
               <span className="badge muted">finish: {result.finish_reason}</span>
             )}
+            {result.cached && <span className="badge muted">desde caché</span>}
           </div>
 
           {result.sources?.length > 0 && (
@@ -52,7 +53,7 @@ export default function ResponsePanel({ result, useRag, loading, ragHasContent,
 
           {result.logprobs?.length > 0 && <LogprobsPanel logprobs={result.logprobs} />}
 
-          {result.response && (
+          {result.response && !loading && (
             <VerifyPanel
               responseText={result.response}
               ragHasContent={ragHasContent}